@@ -1,27 +1,81 @@
-import time
+import asyncio
+from contextlib import asynccontextmanager
+import logging
 from typing import Any, AsyncIterator
 
 import chess
 import chess.svg
-from fastapi import FastAPI, Request, WebSocket
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, WebSocket
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from chesster.app.board_manager import BoardManager
+from chesster.app.engine_scheduler import (
+    EngineDeadlineExceededError,
+    EngineQueueFullError,
+    Priority,
+)
 from chesster.app.utils import (
     get_engine_move,
     parse_chess_move,
     parse_pgn_into_move_list,
     serialize_board_state,
+    serialize_player_side,
 )
 
 
-app = FastAPI()
+board_manager = BoardManager()
+logger = logging.getLogger(__name__)
+
+
+def _log_warm_up_failure(task: asyncio.Task) -> None:
+    """Log warm-up errors when they happen rather than at shutdown."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Warm-up failed.", exc_info=task.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Warm up lazily-loaded resources in the background while serving requests."""
+    warm_up_task = asyncio.create_task(asyncio.to_thread(board_manager.warm_up))
+    warm_up_task.add_done_callback(_log_warm_up_failure)
+    yield
+    await asyncio.gather(warm_up_task, return_exceptions=True)
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="chesster/app/static"), name="static")
 templates = Jinja2Templates(directory="chesster/app/templates")
 
-board_manager = BoardManager()
+LIVE_MOVE_TIMEOUT = 5.0  # Seconds a live move request may wait for an engine slot.
+OPPONENT_MOVE_DELAY = 1.0  # Seconds between showing the player's and opponent's moves.
+
+
+def _get_session_id(request: Request) -> str:
+    """Identify the session making a request, for fair engine scheduling."""
+    session_id = request.headers.get("x-session-id")
+    if session_id is None and request.client is not None:
+        session_id = request.client.host
+    return session_id or "default"
+
+
+@app.exception_handler(EngineQueueFullError)
+async def engine_queue_full_handler(
+    request: Request, exc: EngineQueueFullError
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"message": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(EngineDeadlineExceededError)
+async def engine_deadline_exceeded_handler(
+    request: Request, exc: EngineDeadlineExceededError
+) -> JSONResponse:
+    return JSONResponse(status_code=503, content={"message": str(exc)})
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -29,70 +83,135 @@ async def root(request: Request):
     return templates.TemplateResponse(request, "index.html")
 
 
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """Report whether lazily-loaded resources are warm."""
+    status_code = 200 if board_manager.ready else 503
+    return JSONResponse(status_code=status_code, content={"ready": board_manager.ready})
+
+
+def _parse_player_side(color: str) -> chess.Color:
+    """Parse side from a string such as "w", "white" or "black"."""
+    if "w" in color:
+        return chess.WHITE
+    else:
+        return chess.BLACK
+
+
 @app.post("/set_player_side/{color}")
 async def set_player_side(color: str) -> dict:
     """Set side to black or white."""
-    if "w" in color:
-        player_side = chess.WHITE
-        side_str = "white"
-    else:
-        player_side = chess.BLACK
-        side_str = "black"
+    player_side = _parse_player_side(color)
     await board_manager.set_player_side(player_side)
+    side_str = serialize_player_side(player_side)
     return {"message": f"Updated player side successfully to {side_str}."}
 
 
+@asynccontextmanager
+async def _board_lock() -> AsyncIterator[None]:
+    """Hold the board lock, responding 503 if it is not free within LIVE_MOVE_TIMEOUT."""
+    try:
+        await asyncio.wait_for(board_manager.lock.acquire(), LIVE_MOVE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Board is busy, try again.")
+    try:
+        yield
+    finally:
+        board_manager.lock.release()
+
+
+def _board_changed(board: chess.Board, move_stack: list[chess.Move]) -> bool:
+    """Check whether the shared board was replaced or moved on since a snapshot."""
+    return board_manager.board is not board or board.move_stack != move_stack
+
+
+async def _get_opponent_move(board: chess.Board, session_id: str) -> chess.Move:
+    """Get engine reply to board, scheduled as a live move.
+
+    Called on a snapshot without holding the board lock, so that a queued
+    engine request neither blocks other board updates nor leaves a half-made
+    move on the board if it is rejected.
+    """
+    return await board_manager.engine_scheduler.run(
+        get_engine_move,
+        board,
+        priority=Priority.LIVE_MOVE,
+        session_id=session_id,
+        timeout=LIVE_MOVE_TIMEOUT,
+    )
+
+
 @app.post("/initialize_game_vs_opponent/{player_side_str}")
-async def initialize_game_vs_opponent(player_side_str: str) -> dict:
+async def initialize_game_vs_opponent(player_side_str: str, request: Request) -> dict:
     """Start new game."""
-    await board_manager.set_board(chess.Board())
-    _ = await set_player_side(player_side_str)
-    if board_manager.player_side == chess.BLACK:
-        opponent_move = get_engine_move(board_manager.board)
-        opponent_move_san = board_manager.board.san(opponent_move)
-        await board_manager.make_move(opponent_move)
-        response = f"Game initialized. Opponent move: {opponent_move_san}."
-    else:
-        response = "Game initialized. Your move."
+    opponent_move = None
+    if _parse_player_side(player_side_str) == chess.BLACK:
+        opponent_move = await _get_opponent_move(
+            chess.Board(), _get_session_id(request)
+        )
+    async with _board_lock():
+        await board_manager.set_board(chess.Board())
+        _ = await set_player_side(player_side_str)
+        if opponent_move is not None:
+            opponent_move_san = board_manager.board.san(opponent_move)
+            await board_manager.make_move(opponent_move)
+            response = f"Game initialized. Opponent move: {opponent_move_san}."
+        else:
+            response = "Game initialized. Your move."
 
     return {"message": response}
 
 
 @app.post("/make_move_vs_opponent/{move_str}")
-async def make_move_vs_opponent(move_str: str) -> dict:
+async def make_move_vs_opponent(move_str: str, request: Request) -> dict:
     """Push move to board against engine. Move should be a valid UCI string."""
-    if board_manager.board.is_game_over():
-        return {"message": "Game over."}
-    move = parse_chess_move(board_manager.board, move_str)
-    if not board_manager.board.is_legal(move):
-        return {"message": "Illegal move, try again."}
-    move_san = board_manager.board.san(move)
-    await board_manager.make_move(move)
-    opponent_move = get_engine_move(board_manager.board)
-    opponent_move_san = board_manager.board.san(opponent_move)
-    time.sleep(1)
-    await board_manager.make_move(opponent_move)
-    response = (
-        f"Successfully made move to {move_san}. Opponent responded by moving"
-        f" to {opponent_move_san}.\n\n"
-        f"Board state:\n{serialize_board_state(board_manager.board, board_manager.player_side)}"
-    )
+    async with _board_lock():
+        if board_manager.board.is_game_over():
+            return {"message": "Game over."}
+        move = parse_chess_move(board_manager.board, move_str)
+        if not board_manager.board.is_legal(move):
+            return {"message": "Illegal move, try again."}
+        move_san = board_manager.board.san(move)
+        board = board_manager.board
+        board_after_move = board.copy()
+        board_after_move.push(move)
+
+    opponent_move = await _get_opponent_move(board_after_move, _get_session_id(request))
+    opponent_move_san = board_after_move.san(opponent_move)
+    board_changed_response = {"message": "Board changed in the meantime, try again."}
+    async with _board_lock():
+        if _board_changed(board, board_after_move.move_stack[:-1]):
+            return board_changed_response
+        await board_manager.make_move(move)
+    await asyncio.sleep(OPPONENT_MOVE_DELAY)
+    async with _board_lock():
+        if _board_changed(board, board_after_move.move_stack):
+            return board_changed_response
+        await board_manager.make_move(opponent_move)
+        response = (
+            f"Successfully made move to {move_san}. Opponent responded by moving"
+            f" to {opponent_move_san}.\n\n"
+            f"Board state:\n{serialize_board_state(board_manager.board, board_manager.player_side)}"
+        )
     return {"message": response}
 
 
 @app.post("/make_board_from_pgn/{pgn_str}/{player_side_str}")
-async def make_board_from_pgn(pgn_str: str, player_side_str: str) -> dict:
+async def make_board_from_pgn(
+    pgn_str: str, player_side_str: str, request: Request
+) -> dict:
     """Initialize board from PGN string."""
     move_stack = parse_pgn_into_move_list(pgn_str)
-    await board_manager.set_board(chess.Board())
-    _ = await set_player_side(player_side_str)
-    for move in move_stack:
-        await board_manager.make_move(move)
-    await board_manager.set_interesting_move_iterator()
-    response = (
-        "Successfully uploaded board. Board state:\n"
-        f"{serialize_board_state(board_manager.board, board_manager.player_side)}"
-    )
+    async with _board_lock():
+        await board_manager.set_board(chess.Board())
+        _ = await set_player_side(player_side_str)
+        for move in move_stack:
+            await board_manager.make_move(move)
+        await board_manager.set_interesting_move_iterator(_get_session_id(request))
+        response = (
+            "Successfully uploaded board. Board state:\n"
+            f"{serialize_board_state(board_manager.board, board_manager.player_side)}"
+        )
     return {"message": response}
 
 
@@ -1,21 +1,112 @@
+import asyncio
+import json
+import logging
 import os
-from typing import Iterator
+import threading
+from typing import TYPE_CHECKING, Optional
 import urllib
 
 import chess
+import chess.engine
 from fastapi import WebSocket, WebSocketDisconnect
-from langserve import RemoteRunnable
 
+from chesster.app.engine_scheduler import (
+    DEFAULT_SESSION_ID,
+    EngineScheduler,
+    EngineSchedulerError,
+    Priority,
+)
+from chesster.app.position_index import (
+    PositionIndex,
+    is_interesting_move,
+    to_player_centipawns,
+)
 from chesster.app.utils import (
     display_board,
     get_engine_score,
     serialize_board_state_with_last_move,
+    serialize_player_side,
+    stream_engine_analysis,
 )
 
+if TYPE_CHECKING:
+    from langserve import RemoteRunnable
 
 LANGSERVE_HOST = os.getenv("LANGSERVE_HOST", "localhost")
 LANGSERVE_SECRET = os.getenv("LANGSERVE_SECRET", "secret")
 CHAT_HISTORY_LENGTH = 50  # Number of most recent (human, ai) exchanges to retain.
+LIVE_ANALYSIS_TIME = 10.0  # Seconds to analyze each displayed position.
+LIVE_ANALYSIS_INTERVAL = 0.25  # Minimum seconds between live evaluation updates.
+LIVE_ANALYSIS_PREFIX = "eval:"
+
+logger = logging.getLogger(__name__)
+
+
+class InterestingMoveIterator:
+    """Iterator over interesting moves in a board manager's move stack.
+
+    Games in the position index use the plies flagged when the index was built.
+    Progress is only recorded once a ply has been scored, so if the engine
+    scheduler rejects a request the next call retries the same ply. Concurrent
+    calls are served one at a time.
+    """
+
+    def __init__(
+        self, board_manager: "BoardManager", session_id: str = DEFAULT_SESSION_ID
+    ):
+        self.board_manager = board_manager
+        self.session_id = session_id
+        self.player_side = board_manager.player_side
+        self.move_stack = list(board_manager.board.move_stack)
+        position_index = board_manager.position_index
+        self.indexed_scores = position_index.get_game_scores(self.move_stack)
+        self.indexed_plies = position_index.get_interesting_plies(
+            self.move_stack, self.player_side
+        )
+        self.new_board = chess.Board()
+        self.centipawns = 0
+        # Separate from the board lock, so that scoring plies does not block moves.
+        self.lock = asyncio.Lock()
+
+    def __aiter__(self) -> "InterestingMoveIterator":
+        return self
+
+    async def __anext__(self) -> dict:
+        async with self.lock:
+            return await self._next_interesting_move()
+
+    async def _next_interesting_move(self) -> dict:
+        player_side = self.player_side
+        while len(self.new_board.move_stack) < len(self.move_stack):
+            ply = len(self.new_board.move_stack)
+            new_board = self.new_board.copy()
+            new_board.push(self.move_stack[ply])
+            if self.indexed_scores is not None:
+                white_centipawns = self.indexed_scores[ply]
+            else:
+                white_centipawns = await self.board_manager._get_white_centipawns(
+                    new_board, self.session_id
+                )
+            self.new_board = new_board
+            new_centipawns = to_player_centipawns(white_centipawns, player_side)
+            if new_centipawns is None:
+                continue
+            delta = new_centipawns - self.centipawns
+            self.centipawns = new_centipawns
+            if self.indexed_plies is not None:
+                is_interesting = ply in self.indexed_plies
+            else:
+                player_just_moved = new_board.turn != player_side
+                is_interesting = is_interesting_move(delta, player_just_moved)
+            if is_interesting:
+                await self.board_manager.update_board(new_board)
+                return {
+                    "board": serialize_board_state_with_last_move(
+                        new_board, player_side
+                    ),
+                    "last_move_centipawns": delta,
+                }
+        raise StopAsyncIteration
 
 
 class BoardManager:
@@ -23,12 +114,47 @@ class BoardManager:
         self.active_websockets: list[WebSocket] = []
         self.last_updated_image = None
         self.board = chess.Board()
+        self.displayed_board = self.board
         self.player_side = chess.WHITE
         self.interesting_move_iterator = None
+        self.engine_scheduler = EngineScheduler()
+        self.lock = asyncio.Lock()  # Serializes requests that modify the board.
         self.chat_history = []
-        self.remote_runnable = RemoteRunnable(
-            f"http://{LANGSERVE_HOST}:8001/chesster", headers={"x-token": LANGSERVE_SECRET}
-        )
+        self.ready = False
+        self._position_index: Optional[PositionIndex] = None
+        self._remote_runnable: Optional["RemoteRunnable"] = None
+        self.live_analysis_enabled = False
+        self._live_analysis_stop_event = threading.Event()
+        self._live_analysis_task: Optional[asyncio.Task] = None
+
+    @property
+    def position_index(self) -> PositionIndex:
+        """Position index, loaded from disk on first use."""
+        if self._position_index is None:
+            self._position_index = PositionIndex.load()
+        return self._position_index
+
+    @position_index.setter
+    def position_index(self, position_index: PositionIndex) -> None:
+        self._position_index = position_index
+
+    @property
+    def remote_runnable(self) -> "RemoteRunnable":
+        """Client for the LangServe server, constructed on first use."""
+        if self._remote_runnable is None:
+            from langserve import RemoteRunnable
+
+            self._remote_runnable = RemoteRunnable(
+                f"http://{LANGSERVE_HOST}:8001/chesster",
+                headers={"x-token": LANGSERVE_SECRET},
+            )
+        return self._remote_runnable
+
+    def warm_up(self) -> None:
+        """Construct lazily-loaded resources ahead of the first request."""
+        _ = self.position_index
+        _ = self.remote_runnable
+        self.ready = True
 
     async def set_board(self, board: chess.Board) -> None:
         """Set board."""
@@ -40,45 +166,124 @@ class BoardManager:
         self.player_side = player_side
         await self.update_board(self.board)
 
-    async def set_interesting_move_iterator(self) -> None:
+    async def set_interesting_move_iterator(
+        self, session_id: str = DEFAULT_SESSION_ID
+    ) -> None:
         """Calculate interesting moves in board's move stack."""
-        self.interesting_move_iterator = self._interesting_move_iterator()
+        self.interesting_move_iterator = InterestingMoveIterator(
+            self, session_id=session_id
+        )
 
     async def make_move(self, move: chess.Move) -> None:
         """Parse move and update board."""
         self.board.push(move)
         await self.update_board(self.board)
 
-    async def _interesting_move_iterator(
-        self, centipawn_threshold: int = 100
-    ) -> Iterator[chess.Board]:
-        """Make iterator over interesting moves according to Chess engine."""
-        new_board = chess.Board()
-        centipawns = 0
-        for move in self.board.move_stack:
-            new_board.push(move)
-            new_centipawns = get_engine_score(new_board, self.player_side)
-            if new_centipawns is None:
-                continue
-            delta = new_centipawns - centipawns
-            if new_board.turn != self.player_side:  # player just moved
-                if abs(delta) > centipawn_threshold:
-                    await self.update_board(new_board)
-                    yield {
-                        "board": serialize_board_state_with_last_move(
-                            new_board, self.player_side
-                        ),
-                        "last_move_centipawns": delta,
-                    }
-            centipawns = new_centipawns
+    async def _get_white_centipawns(
+        self, board: chess.Board, session_id: str
+    ) -> Optional[int]:
+        """Get board score from white's point of view, preferring the position index."""
+        white_centipawns = self.position_index.get_position_score(board)
+        if white_centipawns is None:
+            white_centipawns = await self.engine_scheduler.run(
+                get_engine_score,
+                board.copy(),
+                chess.WHITE,
+                priority=Priority.ANALYSIS,
+                session_id=session_id,
+            )
+        return white_centipawns
+
+    def _get_board_context(self) -> dict:
+        """Describe board position for keying the LangServe response cache."""
+        return {
+            "board_fen": self.board.fen(),
+            "player_side": serialize_player_side(self.player_side),
+            "last_move": self.board.peek().uci() if self.board.move_stack else None,
+        }
+
+    async def _broadcast(self, message: str) -> None:
+        for websocket in self.active_websockets:
+            await websocket.send_text(message)
 
     async def update_board(self, board: chess.Board) -> None:
         """Update SVG string."""
         board_svg = urllib.parse.quote(str(display_board(board, self.player_side)))
         svg_string = f"data:image/svg+xml,{board_svg}"
         self.last_updated_image = svg_string
-        for websocket in self.active_websockets:
-            await websocket.send_text(self.last_updated_image)
+        self.displayed_board = board
+        await self._broadcast(self.last_updated_image)
+        self.restart_live_analysis()
+
+    def stop_live_analysis(self) -> None:
+        """Stop streaming evaluation of the displayed board, if running."""
+        self._live_analysis_stop_event.set()
+        if self._live_analysis_task is not None:
+            self._live_analysis_task.cancel()
+            self._live_analysis_task = None
+
+    def restart_live_analysis(self) -> None:
+        """Stream evaluation of the displayed board, replacing any running analysis."""
+        self.stop_live_analysis()
+        if self.live_analysis_enabled and self.active_websockets:
+            self._live_analysis_stop_event = threading.Event()
+            self._live_analysis_task = asyncio.create_task(
+                self._stream_live_analysis(
+                    self.displayed_board.copy(), self._live_analysis_stop_event
+                )
+            )
+
+    async def _broadcast_live_analysis(self, message: str) -> None:
+        """Send message to each open websocket, skipping ones that have closed."""
+        for websocket in list(self.active_websockets):
+            try:
+                await websocket.send_text(message)
+            except (RuntimeError, WebSocketDisconnect):
+                logger.warning("Could not send live evaluation to closed websocket.")
+
+    async def _stream_live_analysis(
+        self, board: chess.Board, stop_event: threading.Event
+    ) -> None:
+        """Broadcast intermediate engine evaluations of board until stopped."""
+        loop = asyncio.get_running_loop()
+        updates: asyncio.Queue = asyncio.Queue()
+        engine_task = asyncio.create_task(
+            self.engine_scheduler.run(
+                stream_engine_analysis,
+                board,
+                self.player_side,
+                lambda info: loop.call_soon_threadsafe(updates.put_nowait, info),
+                stop_event,
+                LIVE_ANALYSIS_TIME,
+                LIVE_ANALYSIS_INTERVAL,
+                priority=Priority.HINT,
+                session_id="live_analysis",
+            )
+        )
+        update_task: Optional[asyncio.Task] = None
+        try:
+            while not (engine_task.done() and updates.empty()):
+                update_task = asyncio.create_task(updates.get())
+                await asyncio.wait(
+                    {update_task, engine_task}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not update_task.done():
+                    update_task.cancel()
+                    continue
+                if not stop_event.is_set():
+                    await self._broadcast_live_analysis(
+                        f"{LIVE_ANALYSIS_PREFIX}{json.dumps(update_task.result())}"
+                    )
+            await engine_task
+        except EngineSchedulerError:
+            pass  # Engine is busy; live evaluation is best-effort.
+        except (FileNotFoundError, chess.engine.EngineError):
+            logger.exception("Live analysis of %s failed.", board.fen())
+        finally:
+            # Cancelled when replaced by analysis of a newer position.
+            engine_task.cancel()
+            if update_task is not None:
+                update_task.cancel()
 
     async def websocket_endpoint(self, websocket: WebSocket):
         await websocket.accept()
@@ -91,6 +296,12 @@ class BoardManager:
                 if data == "Show me the image":
                     if self.last_updated_image is not None:
                         await websocket.send_text(self.last_updated_image)
+                elif data == "Start analysis":
+                    self.live_analysis_enabled = True
+                    self.restart_live_analysis()
+                elif data == "Stop analysis":
+                    self.live_analysis_enabled = False
+                    self.stop_live_analysis()
                 else:
                     user_message = data
                     await websocket.send_text(user_message)
@@ -98,6 +309,7 @@ class BoardManager:
                         {
                             "user_message": user_message,
                             "chat_history": self.chat_history,
+                            **self._get_board_context(),
                         }
                     )
                     self.chat_history.append((user_message, response_message))
@@ -105,3 +317,5 @@ class BoardManager:
                     await websocket.send_text(response_message)
         except WebSocketDisconnect:
             self.active_websockets.remove(websocket)
+            if not self.active_websockets:
+                self.stop_live_analysis()
@@ -0,0 +1,185 @@
+import asyncio
+import enum
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, TypeVar
+
+
+ENGINE_MAX_CONCURRENCY = int(os.getenv("ENGINE_MAX_CONCURRENCY", os.cpu_count() or 1))
+ENGINE_MAX_QUEUE_DEPTH = int(os.getenv("ENGINE_MAX_QUEUE_DEPTH", "64"))
+ENGINE_MAX_SESSION_QUEUE_DEPTH = int(os.getenv("ENGINE_MAX_SESSION_QUEUE_DEPTH", "16"))
+DEFAULT_SESSION_ID = "default"
+
+T = TypeVar("T")
+
+
+class Priority(enum.IntEnum):
+    """Engine request priority classes. Lower values are scheduled first."""
+
+    LIVE_MOVE = 0
+    HINT = 1
+    ANALYSIS = 2
+
+
+class EngineSchedulerError(Exception):
+    """Base class for engine admission errors."""
+
+
+class EngineQueueFullError(EngineSchedulerError):
+    """Raised when an engine request is rejected because the queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Engine queue is full, retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class EngineDeadlineExceededError(EngineSchedulerError):
+    """Raised when an engine request's deadline passes before it is scheduled."""
+
+
+@dataclass
+class _Job:
+    session_id: str
+    deadline: Optional[float]
+    future: asyncio.Future = field(repr=False)
+
+
+class EngineScheduler:
+    """Admission control and fair scheduling for engine calls.
+
+    At most `max_concurrency` engine calls run at once. Waiting calls are served
+    by priority class, and round-robin across sessions within a class so that one
+    session's bulk analysis cannot starve another's.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = ENGINE_MAX_CONCURRENCY,
+        max_queue_depth: int = ENGINE_MAX_QUEUE_DEPTH,
+        max_session_queue_depth: int = ENGINE_MAX_SESSION_QUEUE_DEPTH,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue_depth = max_queue_depth
+        self.max_session_queue_depth = max_session_queue_depth
+        self.running = 0
+        self._queues: dict[Priority, OrderedDict[str, deque[_Job]]] = {
+            priority: OrderedDict() for priority in Priority
+        }
+        self._session_queue_depths: dict[str, int] = {}
+        self._average_job_seconds = 0.1
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of engine calls waiting to be scheduled."""
+        return sum(self._session_queue_depths.values())
+
+    def retry_after(self) -> int:
+        """Estimate seconds until the current queue drains."""
+        batches = (self.queue_depth + self.running) / self.max_concurrency
+        return max(1, math.ceil(batches * self._average_job_seconds))
+
+    async def run(
+        self,
+        func: Callable[..., T],
+        *args: Any,
+        priority: Priority = Priority.ANALYSIS,
+        session_id: str = DEFAULT_SESSION_ID,
+        timeout: Optional[float] = None,
+    ) -> T:
+        """Run blocking engine call `func(*args)` in a worker thread once admitted.
+
+        If `timeout` seconds elapse before the call is scheduled, it is dropped
+        from the queue and EngineDeadlineExceededError is raised. Cancelling a
+        call that is already running does not free its slot until it returns.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        await self._acquire(priority, session_id, deadline)
+        start = time.monotonic()
+
+        def _on_done(task: asyncio.Task) -> None:
+            if not task.cancelled():
+                task.exception()  # Retrieved here in case the caller was cancelled.
+            elapsed = time.monotonic() - start
+            self._average_job_seconds = 0.8 * self._average_job_seconds + 0.2 * elapsed
+            self._release()
+
+        # A worker thread cannot be interrupted, so if the caller is cancelled the
+        # slot stays taken until the thread finishes.
+        task = asyncio.create_task(asyncio.to_thread(func, *args))
+        task.add_done_callback(_on_done)
+        return await asyncio.shield(task)
+
+    async def _acquire(
+        self, priority: Priority, session_id: str, deadline: Optional[float]
+    ) -> None:
+        """Wait for a free engine slot."""
+        if self.running < self.max_concurrency and self.queue_depth == 0:
+            self.running += 1
+            return
+        if (
+            self.queue_depth >= self.max_queue_depth
+            or self._session_queue_depths.get(session_id, 0)
+            >= self.max_session_queue_depth
+        ):
+            raise EngineQueueFullError(self.retry_after())
+
+        job = _Job(session_id, deadline, asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(session_id, deque()).append(job)
+        self._session_queue_depths[session_id] = (
+            self._session_queue_depths.get(session_id, 0) + 1
+        )
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(asyncio.shield(job.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if job.future.done() and not job.future.cancelled():
+                # Slot was handed over concurrently with the timeout; give it back.
+                self._release()
+            else:
+                job.future.cancel()
+                self._discard(priority, job)
+            if isinstance(e, asyncio.TimeoutError):
+                raise EngineDeadlineExceededError(
+                    "Engine request deadline exceeded while queued."
+                ) from e
+            raise
+
+    def _discard(self, priority: Priority, job: _Job) -> None:
+        """Remove a job that will not run from its session queue."""
+        session_queue = self._queues[priority].get(job.session_id)
+        if session_queue is not None and job in session_queue:
+            session_queue.remove(job)
+            if not session_queue:
+                del self._queues[priority][job.session_id]
+            self._decrement_session_depth(job.session_id)
+
+    def _decrement_session_depth(self, session_id: str) -> None:
+        self._session_queue_depths[session_id] -= 1
+        if self._session_queue_depths[session_id] == 0:
+            del self._session_queue_depths[session_id]
+
+    def _next_job(self) -> Optional[_Job]:
+        """Pop next job: highest priority first, round-robin across sessions."""
+        for priority in Priority:
+            sessions = self._queues[priority]
+            while sessions:
+                session_id, session_queue = sessions.popitem(last=False)
+                job = session_queue.popleft()
+                if session_queue:
+                    sessions[session_id] = session_queue  # Move to back of line.
+                self._decrement_session_depth(session_id)
+                expired = job.deadline is not None and job.deadline <= time.monotonic()
+                if not expired and not job.future.done():
+                    return job
+        return None
+
+    def _release(self) -> None:
+        """Free a slot and hand it to the next waiting job, if any."""
+        job = self._next_job()
+        if job is None:
+            self.running -= 1
+        else:
+            job.future.set_result(None)
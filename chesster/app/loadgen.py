@@ -0,0 +1,303 @@
+"""Load generator for the app server's game API.
+
+Simulated players start games and play random legal moves against the engine,
+optionally alongside websocket viewers. Run against a server with
+
+    python -m chesster.app.loadgen --url http://localhost:8000 --players 20 --viewers 5
+
+or against the app in-process by omitting --url.
+
+The app serves a single shared board, so concurrent players overwrite each
+other's games. Moves rejected for that reason are reported as conflicts,
+separately from errors and from requests throttled by engine admission control
+(HTTP 429); players resynchronize by starting a new game.
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass, field
+import json
+import math
+import os
+import random
+import re
+import time
+from typing import Optional
+
+import chess
+import httpx
+
+
+REQUEST_TIMEOUT = 30.0  # Seconds.
+ERROR_BACKOFF = 1.0  # Seconds to wait after a failed request.
+OPPONENT_MOVE_PATTERN = re.compile(r"(?:Opponent move:|moving\s+to) (\S+?)\.(?:\s|$)")
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return math.nan
+    sorted_values = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def count_engine_processes() -> Optional[int]:
+    """Count running engine processes on this host. Returns None if /proc is unavailable."""
+    engine_name = os.path.basename(
+        os.getenv("STOCKFISH_ENGINE_PATH", "stockfish-ubuntu-x86-64-modern")
+    )
+    if not os.path.isdir("/proc"):
+        return None
+    count = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().split(b"\0")[0].decode(errors="ignore")
+        except OSError:
+            continue
+        if os.path.basename(cmdline) == engine_name:
+            count += 1
+    return count
+
+
+@dataclass
+class LoadStats:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    throttled: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    conflicts: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    viewer_messages: int = 0
+    viewer_errors: int = 0
+    engine_processes: list[tuple[float, Optional[int]]] = field(default_factory=list)
+
+    def report(self, duration: float) -> dict:
+        """Summarize throughput, latency percentiles and error rates."""
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            num_requests = len(latencies)
+            endpoints[endpoint] = {
+                "requests": num_requests,
+                "throughput": num_requests / duration,
+                "error_rate": self.errors[endpoint] / num_requests,
+                "throttled": self.throttled[endpoint],
+                "conflicts": self.conflicts[endpoint],
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies),
+            }
+        num_requests = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            "duration": duration,
+            "requests": num_requests,
+            "throughput": num_requests / duration,
+            "error_rate": sum(self.errors.values()) / max(1, num_requests),
+            "endpoints": endpoints,
+            "viewer_messages": self.viewer_messages,
+            "viewer_errors": self.viewer_errors,
+            "engine_processes": self.engine_processes,
+        }
+
+
+async def _post(
+    client: httpx.AsyncClient, stats: LoadStats, endpoint: str, path: str
+) -> Optional[str]:
+    """POST to the API, recording latency. Returns response message, or None on failure."""
+    start = time.perf_counter()
+    try:
+        response = await client.post(path)
+    except httpx.HTTPError:
+        stats.latencies[endpoint].append(time.perf_counter() - start)
+        stats.errors[endpoint] += 1
+        await asyncio.sleep(ERROR_BACKOFF)
+        return None
+    stats.latencies[endpoint].append(time.perf_counter() - start)
+    if response.status_code == 429:
+        stats.throttled[endpoint] += 1
+        await asyncio.sleep(float(response.headers.get("Retry-After", ERROR_BACKOFF)))
+        return None
+    if response.status_code != 200:
+        stats.errors[endpoint] += 1
+        await asyncio.sleep(ERROR_BACKOFF)
+        return None
+    return response.json()["message"]
+
+
+def _push_opponent_move(board: chess.Board, message: str) -> bool:
+    """Apply opponent move reported by the server. Returns False if out of sync."""
+    match = OPPONENT_MOVE_PATTERN.search(message)
+    if match is None:
+        return False
+    try:
+        board.push_san(match.group(1))
+    except ValueError:
+        return False
+    return True
+
+
+async def _run_player(
+    client: httpx.AsyncClient, stats: LoadStats, deadline: float
+) -> None:
+    """Play games of random legal moves until the deadline."""
+    board = None
+    while time.monotonic() < deadline:
+        if board is None or board.is_game_over():
+            side = random.choice(["white", "black"])
+            message = await _post(
+                client,
+                stats,
+                "initialize_game_vs_opponent",
+                f"/initialize_game_vs_opponent/{side}",
+            )
+            if message is None:
+                continue
+            board = chess.Board()
+            if side == "black" and not _push_opponent_move(board, message):
+                board = None
+            continue
+        move = random.choice(list(board.legal_moves))
+        message = await _post(
+            client,
+            stats,
+            "make_move_vs_opponent",
+            f"/make_move_vs_opponent/{move.uci()}",
+        )
+        if message is None:
+            board = None
+            continue
+        board.push(move)
+        if board.is_game_over():
+            continue
+        if not _push_opponent_move(board, message):
+            stats.conflicts["make_move_vs_opponent"] += 1
+            board = None
+
+
+async def _run_viewer(ws_url: str, stats: LoadStats, deadline: float) -> None:
+    """Watch board updates over the websocket until the deadline."""
+    import websockets
+
+    while time.monotonic() < deadline:
+        try:
+            async with websockets.connect(ws_url) as websocket:
+                await websocket.send("Show me the image")
+                while True:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        return
+                    try:
+                        await asyncio.wait_for(websocket.recv(), timeout)
+                    except asyncio.TimeoutError:
+                        return
+                    stats.viewer_messages += 1
+        except (OSError, websockets.WebSocketException):
+            stats.viewer_errors += 1
+            await asyncio.sleep(1)
+
+
+async def _sample_engine_processes(
+    stats: LoadStats, start: float, deadline: float, interval: float
+) -> None:
+    while time.monotonic() < deadline:
+        stats.engine_processes.append(
+            (round(time.monotonic() - start, 1), count_engine_processes())
+        )
+        await asyncio.sleep(interval)
+
+
+async def run_load(
+    url: Optional[str] = None,
+    num_players: int = 10,
+    num_viewers: int = 0,
+    duration: float = 30.0,
+    sample_interval: float = 1.0,
+) -> dict:
+    """Run simulated players and viewers, against `url` or the in-process app."""
+    if url is None:
+        if num_viewers:
+            raise ValueError("Websocket viewers require a running server; pass a URL.")
+        from chesster.app.app import app
+
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        base_url = "http://testserver"
+    else:
+        transport = None
+        base_url = url.rstrip("/")
+
+    stats = LoadStats()
+    start = time.monotonic()
+    deadline = start + duration
+    clients = [
+        httpx.AsyncClient(
+            base_url=base_url,
+            transport=transport,
+            timeout=REQUEST_TIMEOUT,
+            headers={"x-session-id": f"loadgen-player-{i}"},
+        )
+        for i in range(num_players)
+    ]
+    tasks = [_run_player(client, stats, deadline) for client in clients]
+    ws_url = re.sub(r"^http", "ws", base_url) + "/ws"
+    tasks.extend(_run_viewer(ws_url, stats, deadline) for _ in range(num_viewers))
+    tasks.append(_sample_engine_processes(stats, start, deadline, sample_interval))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for client in clients:
+            await client.aclose()
+    return stats.report(time.monotonic() - start)
+
+
+def _print_report(report: dict) -> None:
+    print(
+        f"{report['requests']} requests in {report['duration']:.1f}s "
+        f"({report['throughput']:.2f} req/s), error rate {report['error_rate']:.1%}"
+    )
+    for endpoint, endpoint_report in report["endpoints"].items():
+        print(
+            f"  {endpoint}: {endpoint_report['requests']} requests, "
+            f"{endpoint_report['throughput']:.2f} req/s, "
+            f"errors {endpoint_report['error_rate']:.1%}, "
+            f"throttled {endpoint_report['throttled']}, "
+            f"conflicts {endpoint_report['conflicts']}, "
+            f"p50 {endpoint_report['p50']:.3f}s, p90 {endpoint_report['p90']:.3f}s, "
+            f"p99 {endpoint_report['p99']:.3f}s, max {endpoint_report['max']:.3f}s"
+        )
+    print(
+        f"Viewers: {report['viewer_messages']} messages, "
+        f"{report['viewer_errors']} connection errors"
+    )
+    engine_counts = [
+        count for _, count in report["engine_processes"] if count is not None
+    ]
+    if engine_counts:
+        timeline = " ".join(f"{t}s:{count}" for t, count in report["engine_processes"])
+        print(f"Engine processes: max {max(engine_counts)}; {timeline}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Server URL. Runs the app in-process if omitted.")
+    parser.add_argument("--players", type=int, default=10)
+    parser.add_argument("--viewers", type=int, default=0)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds.")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds.")
+    parser.add_argument("--json", help="Also write the report to this JSON file.")
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run_load(
+            args.url, args.players, args.viewers, args.duration, args.sample_interval
+        )
+    )
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Precomputed engine analysis for a corpus of games.
+
+Build an index from PGN files with
+
+    python -m chesster.app.position_index games.pgn --output position_index.json.gz
+
+The app loads the index from POSITION_INDEX_PATH and consults it before
+calling the engine when walking through interesting moves of an uploaded game.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+from typing import Iterable, Optional
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+from chesster.app.engine_scheduler import (
+    ENGINE_MAX_CONCURRENCY,
+    EngineScheduler,
+    Priority,
+)
+from chesster.app.utils import get_engine_score, serialize_player_side
+
+
+POSITION_INDEX_PATH = os.getenv("POSITION_INDEX_PATH", "position_index.json.gz")
+INDEX_VERSION = 1
+CENTIPAWN_THRESHOLD = 100
+
+
+def get_game_hash(moves: Iterable[chess.Move]) -> str:
+    """Hash a game played from the standard starting position."""
+    uci_moves = " ".join(move.uci() for move in moves)
+    return hashlib.sha1(uci_moves.encode()).hexdigest()
+
+
+def get_position_hash(board: chess.Board) -> str:
+    """Hash a position, independent of the moves that led to it."""
+    return format(chess.polyglot.zobrist_hash(board), "016x")
+
+
+def to_player_centipawns(
+    white_centipawns: Optional[int], player_side: chess.Color
+) -> Optional[int]:
+    """Convert score from white's point of view to the player's."""
+    if white_centipawns is None or player_side == chess.WHITE:
+        return white_centipawns
+    return -white_centipawns
+
+
+def is_interesting_move(centipawn_delta: int, player_just_moved: bool) -> bool:
+    """Check whether a move by the player swung the score by more than the threshold."""
+    return player_just_moved and abs(centipawn_delta) > CENTIPAWN_THRESHOLD
+
+
+def get_interesting_plies(
+    white_scores: list[Optional[int]], player_side: chess.Color
+) -> list[int]:
+    """Get plies of the player's interesting moves in a game."""
+    interesting_plies = []
+    centipawns = 0
+    for ply, white_centipawns in enumerate(white_scores):
+        new_centipawns = to_player_centipawns(white_centipawns, player_side)
+        if new_centipawns is None:
+            continue
+        player_just_moved = (ply % 2 == 0) == (player_side == chess.WHITE)
+        if is_interesting_move(new_centipawns - centipawns, player_just_moved):
+            interesting_plies.append(ply)
+        centipawns = new_centipawns
+    return interesting_plies
+
+
+class PositionIndex:
+    """Engine scores keyed by game hash and by position hash.
+
+    Scores are in centipawns from white's point of view; None marks positions
+    the engine scored as mate.
+    """
+
+    def __init__(
+        self,
+        games: Optional[dict[str, dict]] = None,
+        positions: Optional[dict[str, int]] = None,
+    ):
+        self.games = games or {}
+        self.positions = positions or {}
+
+    @classmethod
+    def load(cls, path: str = POSITION_INDEX_PATH) -> "PositionIndex":
+        """Load index from disk. Returns an empty index if the file does not exist."""
+        if not os.path.exists(path):
+            return cls()
+        with gzip.open(path, "rt") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported position index version in {path}.")
+        return cls(games=data["games"], positions=data["positions"])
+
+    def save(self, path: str = POSITION_INDEX_PATH) -> None:
+        """Write index to disk."""
+        data = {
+            "version": INDEX_VERSION,
+            "games": self.games,
+            "positions": self.positions,
+        }
+        with gzip.open(path, "wt") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    def get_game_scores(
+        self, moves: Iterable[chess.Move]
+    ) -> Optional[list[Optional[int]]]:
+        """Get per-ply scores for a previously indexed game."""
+        game = self.games.get(get_game_hash(moves))
+        if game is None:
+            return None
+        return game["scores"]
+
+    def get_interesting_plies(
+        self, moves: Iterable[chess.Move], player_side: chess.Color
+    ) -> Optional[list[int]]:
+        """Get plies of the player's interesting moves in a previously indexed game."""
+        game = self.games.get(get_game_hash(moves))
+        if game is None:
+            return None
+        return game["flagged"][serialize_player_side(player_side)]
+
+    def get_position_score(self, board: chess.Board) -> Optional[int]:
+        """Get score for a previously analyzed position."""
+        return self.positions.get(get_position_hash(board))
+
+    def add_game(
+        self, moves: list[chess.Move], white_scores: list[Optional[int]]
+    ) -> None:
+        """Record per-ply scores and interesting moves for both sides of a game."""
+        self.games[get_game_hash(moves)] = {
+            "scores": white_scores,
+            "flagged": {
+                "white": get_interesting_plies(white_scores, chess.WHITE),
+                "black": get_interesting_plies(white_scores, chess.BLACK),
+            },
+        }
+        board = chess.Board()
+        for move, white_centipawns in zip(moves, white_scores):
+            board.push(move)
+            if white_centipawns is not None:
+                self.positions[get_position_hash(board)] = white_centipawns
+
+
+async def _analyze_game(
+    index: PositionIndex, scheduler: EngineScheduler, moves: list[chess.Move]
+) -> None:
+    """Score each ply of a game, reusing scores of positions seen before."""
+    session_id = get_game_hash(moves)
+    board = chess.Board()
+    white_scores: list[Optional[int]] = []
+    for move in moves:
+        board.push(move)
+        white_centipawns = index.get_position_score(board)
+        if white_centipawns is None:
+            white_centipawns = await scheduler.run(
+                get_engine_score,
+                board.copy(),
+                chess.WHITE,
+                priority=Priority.ANALYSIS,
+                session_id=session_id,
+            )
+            if white_centipawns is not None:
+                index.positions[get_position_hash(board)] = white_centipawns
+        white_scores.append(white_centipawns)
+    index.add_game(moves, white_scores)
+
+
+def _read_games(pgn_paths: list[str]) -> Iterable[list[chess.Move]]:
+    """Read main lines of games played from the standard starting position."""
+    for pgn_path in pgn_paths:
+        with open(pgn_path) as pgn_fp:
+            while (game := chess.pgn.read_game(pgn_fp)) is not None:
+                if "FEN" in game.headers:
+                    continue
+                yield list(game.mainline_moves())
+
+
+async def build_index(
+    index: PositionIndex,
+    pgn_paths: list[str],
+    concurrency: int = ENGINE_MAX_CONCURRENCY,
+) -> int:
+    """Analyze games in PGN files that are not yet in the index. Returns count added."""
+    scheduler = EngineScheduler(max_concurrency=concurrency)
+    games: asyncio.Queue = asyncio.Queue()
+    queued_hashes = set()
+    for moves in _read_games(pgn_paths):
+        game_hash = get_game_hash(moves)
+        if game_hash not in index.games and game_hash not in queued_hashes:
+            queued_hashes.add(game_hash)
+            games.put_nowait(moves)
+    num_games = games.qsize()
+
+    async def _worker() -> None:
+        while not games.empty():
+            moves = games.get_nowait()
+            await _analyze_game(index, scheduler, moves)
+
+    await asyncio.gather(*(_worker() for _ in range(scheduler.max_concurrency)))
+    return num_games
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pgn_paths", nargs="+", help="PGN files to index.")
+    parser.add_argument("--output", default=POSITION_INDEX_PATH)
+    parser.add_argument("--concurrency", type=int, default=ENGINE_MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    index = PositionIndex.load(args.output)
+    num_games = asyncio.run(build_index(index, args.pgn_paths, args.concurrency))
+    index.save(args.output)
+    print(
+        f"Indexed {num_games} new games. Index holds {len(index.games)} games and "
+        f"{len(index.positions)} positions."
+    )
+
+
+if __name__ == "__main__":
+    main()
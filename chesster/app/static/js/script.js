@@ -133,12 +133,34 @@ function updateMessageOpacity() {
 var ws = new WebSocket("ws://localhost:8000/ws");
 ws.onopen = function(event) {
     ws.send("Show me the image");
+    ws.send("Start analysis");
 };
+
+function updateEvalBar(evaluation) {
+    /* Evaluation is from the player's point of view */
+    var percent;
+    var text;
+    if (evaluation.mate !== null) {
+        percent = evaluation.mate > 0 ? 100 : 0;
+        text = 'Mate in ' + Math.abs(evaluation.mate);
+    } else {
+        percent = Math.max(0, Math.min(100, 50 + evaluation.centipawns / 20));
+        text = (evaluation.centipawns > 0 ? '+' : '') + (evaluation.centipawns / 100).toFixed(2);
+    }
+    document.getElementById('eval-bar').style.display = 'block';
+    document.getElementById('eval-fill').style.width = percent + '%';
+    document.getElementById('eval-text').innerText =
+        text + ' (depth ' + evaluation.depth + ') ' + evaluation.pv;
+}
+
 ws.onmessage = function(event) {
     var message = document.getElementById('message')
     var image = document.getElementById('image')
     if (event.data.startsWith("Welcome")) {  /* TODO: fix this hack */
         message.innerText = event.data;
+    } else if (event.data.startsWith("eval:")) {
+        updateEvalBar(JSON.parse(event.data.slice("eval:".length)));
+        return;
     } else if (event.data.startsWith("data:image/svg+xml")) {
         image.src = event.data
         image.style.display = 'block';   /* Show image */
@@ -1,6 +1,8 @@
 import io
 import os
-from typing import Iterable
+import threading
+import time
+from typing import Callable, Iterable
 
 import chess
 import chess.engine
@@ -44,6 +46,51 @@ def get_engine_score(board: chess.Board, player_side: chess.Color) -> int:
         return score.black().score()
 
 
+def _serialize_analysis_info(
+    board: chess.Board, info: chess.engine.InfoDict, player_side: chess.Color
+) -> dict:
+    """Serialize intermediate engine analysis from the player's point of view."""
+    score = info["score"].pov(player_side)
+    return {
+        "depth": info.get("depth"),
+        "centipawns": score.score(),
+        "mate": score.mate(),
+        "pv": board.variation_san(info.get("pv", [])[:5]),
+    }
+
+
+def stream_engine_analysis(
+    board: chess.Board,
+    player_side: chess.Color,
+    on_info: Callable[[dict], None],
+    stop_event: threading.Event,
+    time_limit: float = 10.0,
+    min_interval: float = 0.25,
+) -> None:
+    """Analyze board, passing intermediate results to `on_info` as they arrive.
+
+    Updates are throttled to one per `min_interval` seconds, plus the final
+    result. Stops when `stop_event` is set or the time limit is reached.
+    """
+    if stop_event.is_set():
+        return
+    engine = get_stockfish_engine()
+    try:
+        with engine.analysis(board, chess.engine.Limit(time=time_limit)) as analysis:
+            last_update = 0.0
+            for info in analysis:
+                if stop_event.is_set():
+                    return
+                if "score" not in info or time.monotonic() - last_update < min_interval:
+                    continue
+                last_update = time.monotonic()
+                on_info(_serialize_analysis_info(board, info, player_side))
+            if "score" in analysis.info:
+                on_info(_serialize_analysis_info(board, analysis.info, player_side))
+    finally:
+        engine.quit()
+
+
 def parse_chess_move(board: chess.Board, move_uci: str) -> chess.Move:
     """Parse chess move from UCI format."""
     try:
@@ -1,27 +1,25 @@
+from collections import OrderedDict
+from functools import lru_cache
+import threading
 from textwrap import dedent
+from typing import Any
 
 from langchain.agents.format_scratchpad import format_to_openai_function_messages
 from langchain.agents.output_parsers import OpenAIFunctionsAgentOutputParser
-from langchain.schema import AIMessage, HumanMessage
+from langchain.schema import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain.tools.render import format_tool_to_openai_function
 from langchain_community.chat_models import ChatOpenAI
+from langchain_core.agents import AgentAction
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import Runnable
 
 from chesster.langserve.tools import get_tools
 
 
-def _format_chat_history(chat_history: list[tuple[str, str]]):
-    buffer = []
-    for human, ai in chat_history:
-        buffer.append(HumanMessage(content=human))
-        buffer.append(AIMessage(content=ai))
-    return buffer
-
-
-def get_agent() -> Runnable:
-    """Get Langchain Runnable for analyzing and modifying board."""
-    system_message = """
+# Keep the system message free of per-request content: together with the tool
+# definitions it forms a static prompt prefix that provider prompt caching can reuse.
+SYSTEM_MESSAGE = dedent(
+    """
     You are a seasoned chess instructor. You are interacting with a student. Help them learn chess
     and have a good time.
 
@@ -49,31 +47,87 @@ def get_agent() -> Runnable:
 
     Limit your commentary to 20 words or fewer.
     """
-    tools = get_tools()
-    prompt = ChatPromptTemplate.from_messages(
+)
+SCRATCHPAD_CACHE_SIZE = 256  # Number of (action, observation) steps to keep formatted.
+
+
+@lru_cache(maxsize=1024)
+def _format_chat_turn(human: str, ai: str) -> tuple[HumanMessage, AIMessage]:
+    return HumanMessage(content=human), AIMessage(content=ai)
+
+
+def _format_chat_history(chat_history: list[tuple[str, str]]):
+    buffer = []
+    for human, ai in chat_history:
+        buffer.extend(_format_chat_turn(human, ai))
+    return buffer
+
+
+@lru_cache(maxsize=None)
+def get_prompt() -> ChatPromptTemplate:
+    """Get agent prompt. The system message is a fixed message, not a template."""
+    return ChatPromptTemplate.from_messages(
         [
-            ("system", dedent(system_message)),
+            SystemMessage(content=SYSTEM_MESSAGE),
             MessagesPlaceholder(variable_name="chat_history"),
             ("user", "{user_message}"),
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ]
     )
 
+
+@lru_cache(maxsize=None)
+def get_tool_functions() -> tuple[dict, ...]:
+    """Get OpenAI function definitions for tools, rendered once per process."""
+    return tuple(format_tool_to_openai_function(tool) for tool in get_tools())
+
+
+class ScratchpadFormatter:
+    """Format intermediate steps as messages, reusing messages of steps seen before.
+
+    The agent executor passes the full list of intermediate steps on every
+    iteration, so only the newly appended steps need formatting.
+    """
+
+    def __init__(self, cache_size: int = SCRATCHPAD_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple[int, int], tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _format_step(self, action: AgentAction, observation: Any) -> list[BaseMessage]:
+        key = (id(action), id(observation))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] is action and cached[1] is observation:
+                self._cache.move_to_end(key)
+                return cached[2]
+        messages = format_to_openai_function_messages([(action, observation)])
+        with self._lock:
+            self._cache[key] = (action, observation, messages)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return messages
+
+    def __call__(self, agent_input: dict) -> list[BaseMessage]:
+        messages = []
+        for action, observation in agent_input["intermediate_steps"]:
+            messages.extend(self._format_step(action, observation))
+        return messages
+
+
+def get_agent() -> Runnable:
+    """Get Langchain Runnable for analyzing and modifying board."""
     # TODO: enable streaming: https://python.langchain.com/docs/modules/agents/how_to/streaming
     llm = ChatOpenAI(model="gpt-4-1106-preview", temperature=0)
-    llm_with_tools = llm.bind(
-        functions=[format_tool_to_openai_function(tool) for tool in tools]
-    )
+    llm_with_tools = llm.bind(functions=list(get_tool_functions()))
 
     agent = (
         {
             "user_message": lambda x: x["user_message"],
             "chat_history": lambda x: _format_chat_history(x["chat_history"]),
-            "agent_scratchpad": lambda x: format_to_openai_function_messages(
-                x["intermediate_steps"]
-            ),
+            "agent_scratchpad": ScratchpadFormatter(),
         }
-        | prompt
+        | get_prompt()
         | llm_with_tools
         | OpenAIFunctionsAgentOutputParser()
     )
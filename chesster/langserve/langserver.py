@@ -1,18 +1,29 @@
 #!/usr/bin/env python
+import asyncio
+from contextlib import asynccontextmanager
+import logging
 import os
+import threading
+from typing import Any, AsyncIterator, Optional
 
 from fastapi import Depends, FastAPI, Header, HTTPException
-from langchain.agents import AgentExecutor
-from langchain.pydantic_v1 import BaseModel, Field
+from fastapi.responses import JSONResponse
+from langchain_core.pydantic_v1 import BaseModel, Field
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 from langserve import add_routes
 from typing_extensions import Annotated
 
-from chesster.langserve.agent import get_agent, get_tools
+from chesster.langserve.response_cache import ResponseCache, used_mutating_tool
 
 
 HOST = os.getenv("LANGSERVE_HOST", "localhost")
 LANGSERVE_SECRET = os.getenv("LANGSERVE_SECRET", "secret")
 
+_agent_executor: Optional[Runnable] = None
+_agent_executor_lock = threading.Lock()
+response_cache = ResponseCache()
+logger = logging.getLogger(__name__)
+
 
 async def verify_token(x_token: Annotated[str, Header()]) -> None:
     """Verify the token is valid."""
@@ -21,10 +32,41 @@ async def verify_token(x_token: Annotated[str, Header()]) -> None:
         raise HTTPException(status_code=400, detail="X-Token header invalid")
 
 
+def get_agent_executor() -> Runnable:
+    """Build agent executor on first use. Defers importing langchain agents and LLM client."""
+    global _agent_executor
+    with _agent_executor_lock:
+        if _agent_executor is None:
+            from langchain.agents import AgentExecutor
+
+            from chesster.langserve.agent import get_agent, get_tools
+
+            _agent_executor = AgentExecutor(
+                agent=get_agent(), tools=get_tools(), return_intermediate_steps=True
+            )
+    return _agent_executor
+
+
+def _log_warm_up_failure(task: asyncio.Task) -> None:
+    """Log a failed agent build as soon as it happens."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Warm-up failed.", exc_info=task.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Build the agent in the background while serving requests."""
+    warm_up_task = asyncio.create_task(asyncio.to_thread(get_agent_executor))
+    warm_up_task.add_done_callback(_log_warm_up_failure)
+    yield
+    await asyncio.gather(warm_up_task, return_exceptions=True)
+
+
 app = FastAPI(
     title="Chesster chat server.",
     version="1.0",
     dependencies=[Depends(verify_token)],
+    lifespan=lifespan,
 )
 
 
@@ -33,13 +75,51 @@ class AgentInput(BaseModel):
     chat_history: list[tuple[str, str]] = Field(
         ..., extra={"widget": {"type": "chat", "input": "input", "output": "output"}}
     )
+    # Board context, used to key the response cache.
+    board_fen: Optional[str] = None
+    player_side: Optional[str] = None
+    last_move: Optional[str] = None
+
+
+def _get_executor_input(agent_input: dict) -> dict:
+    return {
+        "user_message": agent_input["user_message"],
+        "chat_history": agent_input["chat_history"],
+    }
+
+
+def _cache_response(cache_key: Any, result: dict) -> str:
+    """Cache agent output unless the agent changed the board."""
+    if cache_key is not None and not used_mutating_tool(result["intermediate_steps"]):
+        response_cache.set(cache_key, result["output"])
+    return result["output"]
 
 
-tools = get_tools()
-agent = get_agent()
-agent_executor = AgentExecutor(agent=agent, tools=tools).with_types(
-    input_type=AgentInput
-) | (lambda x: x["output"])
+def _invoke_agent(agent_input: dict, config: RunnableConfig) -> Any:
+    cache_key = response_cache.get_key(agent_input)
+    cached_response = None if cache_key is None else response_cache.get(cache_key)
+    if cached_response is not None:
+        return cached_response
+    result = get_agent_executor().invoke(_get_executor_input(agent_input), config)
+    return _cache_response(cache_key, result)
+
+
+async def _ainvoke_agent(agent_input: dict, config: RunnableConfig) -> Any:
+    cache_key = response_cache.get_key(agent_input)
+    cached_response = None if cache_key is None else response_cache.get(cache_key)
+    if cached_response is not None:
+        return cached_response
+    if _agent_executor is None:
+        await asyncio.to_thread(get_agent_executor)
+    result = await get_agent_executor().ainvoke(
+        _get_executor_input(agent_input), config
+    )
+    return _cache_response(cache_key, result)
+
+
+agent_executor = RunnableLambda(_invoke_agent, afunc=_ainvoke_agent).with_types(
+    input_type=AgentInput, output_type=str
+)
 
 add_routes(
     app,
@@ -47,6 +127,22 @@ add_routes(
     path="/chesster",
 )
 
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """Report whether the agent has been built."""
+    is_ready = _agent_executor is not None
+    return JSONResponse(
+        status_code=200 if is_ready else 503, content={"ready": is_ready}
+    )
+
+
+@app.get("/cache_metrics")
+async def cache_metrics() -> dict:
+    """Report response cache size and hit rate."""
+    return response_cache.metrics()
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,114 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))  # Seconds.
+
+# Tools that change the board. Responses of turns that used them are not cached.
+MUTATING_TOOLS = {
+    "initialize_game",
+    "make_chess_move",
+    "initialize_game_from_pgn",
+    "get_next_interesting_move",
+}
+# Messages that likely ask to change the board bypass the cache entirely.
+MUTATING_INTENT_PATTERN = re.compile(
+    r"\b(play|start|new game|lets|next|move on|go ahead|continue|upload|pgn"
+    r"|move my|move the|castle|resign|undo|take back|takeback)\b"
+    r"|\b[a-h][1-8][a-h][1-8][qrbn]?\b"  # UCI move
+    r"|\b(?:[kqrbn][a-h]?[1-8]?x?[a-h][1-8]|[a-h]x?[a-h]?[1-8]|o-o(?:-o)?)\b"  # SAN move
+)
+
+CacheKey = tuple[str, str, str, Optional[str]]
+
+
+def normalize_message(message: str) -> str:
+    """Normalize user message so trivially different phrasings share a cache entry."""
+    message = message.lower().translate(str.maketrans("", "", "?!.,;:\"'"))
+    return " ".join(message.split())
+
+
+def _normalize_fen(board_fen: str) -> str:
+    """Drop move counters from FEN so transpositions share a cache entry."""
+    return " ".join(board_fen.split()[:4])
+
+
+class ResponseCache:
+    """LRU cache of agent responses keyed by user message and board position.
+
+    Entries expire after `ttl` seconds. Messages with no position context or
+    that look like they would change the board are not cached.
+    """
+
+    def __init__(
+        self, max_size: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self._entries: OrderedDict[CacheKey, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_key(self, agent_input: dict) -> Optional[CacheKey]:
+        """Make cache key for agent input, or None if the input should bypass the cache."""
+        board_fen = agent_input.get("board_fen")
+        user_message = normalize_message(agent_input["user_message"])
+        if (
+            board_fen is None
+            or not user_message
+            or MUTATING_INTENT_PATTERN.search(user_message)
+        ):
+            with self._lock:
+                self.bypasses += 1
+            return None
+        return (
+            user_message,
+            _normalize_fen(board_fen),
+            agent_input.get("player_side") or "",
+            agent_input.get("last_move"),
+        )
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        """Get cached response, if present and not expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: CacheKey, response: str) -> None:
+        """Cache response, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def metrics(self) -> dict:
+        """Get cache size and hit-rate metrics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def used_mutating_tool(intermediate_steps: list) -> bool:
+    """Check whether an agent run called a tool that changes the board."""
+    return any(action.tool in MUTATING_TOOLS for action, _ in intermediate_steps)
@@ -1,6 +1,8 @@
 from unittest.mock import MagicMock, patch
 
 from langchain.agents import AgentExecutor
+from langchain.agents.format_scratchpad import format_to_openai_function_messages
+from langchain.agents.output_parsers.openai_functions import AgentActionMessageLog
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import Runnable
 
@@ -117,3 +119,30 @@ def test_agent(mock_llm, mock_post):
         )
         chat_history.append((user_message, response["output"]))
         assert response["output"] == expected_response
+
+
+def test_scratchpad_formatter():
+    steps = [
+        (
+            AgentActionMessageLog(
+                tool="make_chess_move",
+                tool_input={"move": move},
+                log="",
+                message_log=[AIMessage(content="")],
+            ),
+            {"message": f"Moved {move}."},
+        )
+        for move in ["d2d4", "c2c4"]
+    ]
+    formatter = agent.ScratchpadFormatter()
+    with patch(
+        "chesster.langserve.agent.format_to_openai_function_messages",
+        wraps=format_to_openai_function_messages,
+    ) as mock_format:
+        assert format_to_openai_function_messages(steps[:1]) == formatter(
+            {"intermediate_steps": steps[:1]}
+        )
+        assert format_to_openai_function_messages(steps) == formatter(
+            {"intermediate_steps": steps}
+        )
+    assert 2 == mock_format.call_count
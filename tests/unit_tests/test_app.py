@@ -1,10 +1,17 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
 import urllib
 
 import chess
 from fastapi.testclient import TestClient
+import httpx
 import pytest
 
 from chesster.app import app
+from chesster.app.board_manager import BoardManager
+from chesster.app.engine_scheduler import EngineQueueFullError, EngineScheduler
 
 
 client = TestClient(app.app)
@@ -49,6 +56,73 @@ def test_make_move_vs_opponent():
     assert chess.Move.from_uci("e2e4") == first_move
 
 
+def test_engine_rejection_leaves_board_unchanged():
+    _ = client.post("/initialize_game_vs_opponent/w")
+    with patch.object(
+        app.board_manager.engine_scheduler,
+        "run",
+        side_effect=EngineQueueFullError(retry_after=2),
+    ):
+        response = client.post("/make_move_vs_opponent/e2e4")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "2"
+        assert [] == app.board_manager.board.move_stack
+
+        response = client.post("/initialize_game_vs_opponent/b")
+        assert response.status_code == 429
+        assert [] == app.board_manager.board.move_stack
+        assert chess.WHITE == app.board_manager.player_side
+
+    response = client.post("/make_move_vs_opponent/e2e4")
+    assert response.status_code == 200
+    assert 2 == len(app.board_manager.board.move_stack)
+
+
+def _slow_engine_move(board: chess.Board) -> chess.Move:
+    time.sleep(0.2)
+    return next(iter(board.legal_moves))
+
+
+@patch("chesster.app.app.OPPONENT_MOVE_DELAY", 0)
+@patch("chesster.app.app.get_engine_move", side_effect=_slow_engine_move)
+def test_engine_move_does_not_hold_board(mock_engine_move):
+    _ = client.post("/initialize_game_vs_opponent/w")
+
+    async def _move_and_restart() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://testserver"
+        ) as async_client:
+            move_task = asyncio.create_task(
+                async_client.post("/make_move_vs_opponent/e2e4")
+            )
+            await asyncio.sleep(0.1)
+            restart_response = await async_client.post("/initialize_game_vs_opponent/w")
+            assert not move_task.done()
+            return [await move_task, restart_response]
+
+    move_response, restart_response = asyncio.run(_move_and_restart())
+    assert "Game initialized. Your move." == restart_response.json()["message"]
+    assert "Board changed" in move_response.json()["message"]
+    assert [] == app.board_manager.board.move_stack
+
+
+def test_board_busy():
+    async def _move_while_locked() -> httpx.Response:
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://testserver"
+        ) as async_client:
+            async with app.board_manager.lock:
+                return await async_client.post("/make_move_vs_opponent/e2e4")
+
+    with patch.object(app.board_manager, "lock", asyncio.Lock()), patch(
+        "chesster.app.app.LIVE_MOVE_TIMEOUT", 0.1
+    ):
+        response = asyncio.run(_move_while_locked())
+    assert 503 == response.status_code
+
+
 def test_make_board_from_pgn_and_get_interesting_moves():
     pgn = "d4 Nf6 2. Nc3 g6 3. Bf4 Bg7 4. Nb5 d6"
     encoded_pgn = urllib.parse.quote(pgn)
@@ -69,3 +143,137 @@ def test_make_board_from_pgn_and_get_interesting_moves():
     assert response.status_code == 200
     response_data = response.json()
     assert {"board", "last_move_centipawns"} == set(response_data["result"].keys())
+
+
+def test_warm_up_failure_is_logged(caplog):
+    with patch.object(
+        app.board_manager, "warm_up", side_effect=RuntimeError("Engine missing.")
+    ):
+        with TestClient(app.app) as lifespan_client:
+            response = lifespan_client.get("/ready")
+            assert 503 == response.status_code
+    assert "Warm-up failed." in caplog.text
+
+
+def _mock_engine_score(board: chess.Board, player_side: chess.Color) -> int:
+    """Score every white move as a 300 centipawn swing."""
+    return 300 if board.turn == chess.BLACK else 0
+
+
+@patch("chesster.app.board_manager.get_engine_score", side_effect=_mock_engine_score)
+def test_get_interesting_moves_after_engine_rejection(mock_engine_score):
+    encoded_pgn = urllib.parse.quote("d4 Nf6 2. Nc3 g6 3. Bf4 Bg7 4. Nb5 d6")
+    _ = client.post(f"/make_board_from_pgn/{encoded_pgn}/w")
+    with patch.object(
+        app.board_manager.engine_scheduler,
+        "run",
+        side_effect=EngineQueueFullError(retry_after=1),
+    ):
+        response = client.post("/get_next_interesting_move")
+        assert response.status_code == 429
+
+    results = [client.post("/get_next_interesting_move").json() for _ in range(5)]
+    assert [300] * 4 == [
+        result["result"]["last_move_centipawns"] for result in results[:4]
+    ]
+    assert {"result": {"result": "End of iteration."}} == results[4]
+
+
+@patch("chesster.app.board_manager.get_engine_score", side_effect=_mock_engine_score)
+def test_concurrent_get_next_interesting_move(mock_engine_score):
+    encoded_pgn = urllib.parse.quote("d4 Nf6 2. Nc3 g6 3. Bf4 Bg7 4. Nb5 d6")
+    _ = client.post(f"/make_board_from_pgn/{encoded_pgn}/w")
+
+    async def _get_next_interesting_moves() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://testserver"
+        ) as async_client:
+            return await asyncio.gather(
+                async_client.post("/get_next_interesting_move/"),
+                async_client.post("/get_next_interesting_move/"),
+            )
+
+    responses = asyncio.run(_get_next_interesting_moves())
+    assert [200, 200] == [response.status_code for response in responses]
+    boards = {response.json()["result"]["board"] for response in responses}
+    assert 2 == len(boards)
+
+
+def _mock_stream_engine_analysis(
+    board: chess.Board, player_side: chess.Color, on_info, stop_event, *args
+) -> None:
+    """Report a single evaluation carrying the analyzed position."""
+    if not stop_event.is_set():
+        on_info({"depth": 1, "centipawns": 0, "mate": None, "pv": board.fen()})
+
+
+class _MockWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send_text(self, message: str) -> None:
+        self.messages.append(message)
+
+
+@patch(
+    "chesster.app.board_manager.stream_engine_analysis",
+    side_effect=_mock_stream_engine_analysis,
+)
+def test_live_analysis_of_last_position(mock_stream_engine_analysis):
+    board_manager = BoardManager()
+    board_manager.engine_scheduler = EngineScheduler(max_concurrency=1)
+    websocket = _MockWebSocket()
+    board_manager.active_websockets.append(websocket)
+    board_manager.live_analysis_enabled = True
+
+    async def _play_moves() -> None:
+        await board_manager.set_board(chess.Board())
+        for _ in range(30):
+            await board_manager.make_move(next(iter(board_manager.board.legal_moves)))
+        await board_manager._live_analysis_task
+
+    asyncio.run(_play_moves())
+    evaluations = [
+        json.loads(message[len("eval:") :])
+        for message in websocket.messages
+        if message.startswith("eval:")
+    ]
+    assert board_manager.board.fen() == evaluations[-1]["pv"]
+
+
+@patch(
+    "chesster.app.board_manager.stream_engine_analysis",
+    side_effect=FileNotFoundError("stockfish"),
+)
+def test_live_analysis_engine_failure_is_logged(mock_stream_engine_analysis, caplog):
+    board_manager = BoardManager()
+    board_manager.active_websockets.append(_MockWebSocket())
+    board_manager.live_analysis_enabled = True
+
+    async def _analyze() -> None:
+        await board_manager.set_board(chess.Board())
+        await board_manager._live_analysis_task
+
+    asyncio.run(_analyze())
+    assert "Live analysis" in caplog.text
+
+
+@patch(
+    "chesster.app.board_manager.stream_engine_analysis",
+    side_effect=_mock_stream_engine_analysis,
+)
+def test_websocket_live_analysis(mock_stream_engine_analysis):
+    with client.websocket_connect("/ws") as websocket:
+        assert "Welcome to Chesster!" == websocket.receive_text()
+        websocket.send_text("Start analysis")
+        for _ in range(10):
+            message = websocket.receive_text()
+            if message.startswith("eval:"):
+                break
+        else:
+            pytest.fail("No live evaluation received.")
+        evaluation = json.loads(message[len("eval:") :])
+        assert {"depth", "centipawns", "mate", "pv"} == set(evaluation.keys())
+        websocket.send_text("Stop analysis")
+    assert not app.board_manager.live_analysis_enabled
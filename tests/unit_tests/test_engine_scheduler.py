@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+import pytest
+
+from chesster.app.engine_scheduler import (
+    EngineDeadlineExceededError,
+    EngineQueueFullError,
+    EngineScheduler,
+    Priority,
+)
+
+
+def _blocking_call(started: threading.Event, release: threading.Event) -> str:
+    """Stand-in for an engine call that holds its slot until released."""
+    started.set()
+    release.wait(timeout=5)
+    return "done"
+
+
+async def _occupy_slot(scheduler: EngineScheduler) -> tuple:
+    """Start a call that occupies the scheduler's only slot."""
+    started, release = threading.Event(), threading.Event()
+    task = asyncio.create_task(scheduler.run(_blocking_call, started, release))
+    while not started.is_set():
+        await asyncio.sleep(0.01)
+    return task, release
+
+
+def test_priority_and_fair_ordering():
+    async def _run() -> list:
+        scheduler = EngineScheduler(max_concurrency=1)
+        blocker, release = await _occupy_slot(scheduler)
+        order = []
+        jobs = [
+            ("a1", Priority.ANALYSIS, "a"),
+            ("a2", Priority.ANALYSIS, "a"),
+            ("b1", Priority.ANALYSIS, "b"),
+            ("live", Priority.LIVE_MOVE, "c"),
+            ("hint", Priority.HINT, "c"),
+        ]
+        tasks = []
+        for name, priority, session_id in jobs:
+            tasks.append(
+                asyncio.create_task(
+                    scheduler.run(
+                        order.append, name, priority=priority, session_id=session_id
+                    )
+                )
+            )
+            await asyncio.sleep(0)
+        assert scheduler.queue_depth == len(jobs)
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        assert scheduler.running == 0
+        assert scheduler.queue_depth == 0
+        return order
+
+    assert ["live", "hint", "a1", "b1", "a2"] == asyncio.run(_run())
+
+
+def test_queue_full():
+    async def _run() -> None:
+        scheduler = EngineScheduler(
+            max_concurrency=1, max_queue_depth=2, max_session_queue_depth=1
+        )
+        blocker, release = await _occupy_slot(scheduler)
+        queued = asyncio.create_task(scheduler.run(str, 1, session_id="a"))
+        await asyncio.sleep(0)
+        with pytest.raises(EngineQueueFullError):  # Session limit
+            await scheduler.run(str, 2, session_id="a")
+        other = asyncio.create_task(scheduler.run(str, 3, session_id="b"))
+        await asyncio.sleep(0)
+        with pytest.raises(EngineQueueFullError) as exc_info:  # Global limit
+            await scheduler.run(str, 4, session_id="c")
+        assert exc_info.value.retry_after >= 1
+        release.set()
+        assert ["done", "1", "3"] == await asyncio.gather(blocker, queued, other)
+
+    asyncio.run(_run())
+
+
+def test_deadline_exceeded():
+    async def _run() -> None:
+        scheduler = EngineScheduler(max_concurrency=1)
+        blocker, release = await _occupy_slot(scheduler)
+        with pytest.raises(EngineDeadlineExceededError):
+            await scheduler.run(str, 1, timeout=0.05)
+        assert scheduler.queue_depth == 0
+        release.set()
+        await blocker
+        assert "2" == await scheduler.run(str, 2)
+        assert scheduler.running == 0
+
+    asyncio.run(_run())
+
+
+def test_cancelled_call_holds_slot_until_done():
+    async def _run() -> None:
+        scheduler = EngineScheduler(max_concurrency=1)
+        blocker, release = await _occupy_slot(scheduler)
+        blocker.cancel()
+        queued = asyncio.create_task(scheduler.run(str, 1))
+        await asyncio.sleep(0.05)
+        assert not queued.done()
+        assert scheduler.running == 1
+        release.set()
+        assert "1" == await queued
+        assert scheduler.running == 0
+
+    asyncio.run(_run())
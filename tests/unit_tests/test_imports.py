@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def _get_imported_modules(module: str) -> set[str]:
+    """Import module in a fresh interpreter and list the modules it loaded."""
+    script = f"import sys; import {module}; print('\\n'.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return set(result.stdout.splitlines())
+
+
+@pytest.mark.parametrize(
+    "module, deferred_modules",
+    [
+        ("chesster.app.app", ["langserve", "langchain", "langchain_core", "openai"]),
+        (
+            "chesster.langserve.langserver",
+            ["langchain.agents", "chesster.langserve.agent", "openai"],
+        ),
+    ],
+)
+def test_heavy_imports_are_deferred(module, deferred_modules):
+    imported_modules = _get_imported_modules(module)
+    assert module in imported_modules
+    for deferred_module in deferred_modules:
+        assert deferred_module not in imported_modules
@@ -0,0 +1,64 @@
+import asyncio
+import math
+import time
+from unittest.mock import patch
+
+import chess
+import httpx
+
+from chesster.app import loadgen
+
+
+def test_percentile():
+    values = [0.4, 0.1, 0.3, 0.2]
+    assert 0.2 == loadgen.percentile(values, 50)
+    assert 0.4 == loadgen.percentile(values, 99)
+    assert 0.1 == loadgen.percentile(values, 0)
+    assert math.isnan(loadgen.percentile([], 50))
+
+
+def test_push_opponent_move():
+    board = chess.Board()
+    assert loadgen._push_opponent_move(board, "Game initialized. Opponent move: e4.")
+    board.push_san("e5")
+    message = (
+        "Successfully made move to e5. Opponent responded by moving to Nf3.\n\n"
+        "Board state:\n..."
+    )
+    assert loadgen._push_opponent_move(board, message)
+    assert chess.Move.from_uci("g1f3") == board.peek()
+    assert not loadgen._push_opponent_move(board, "Illegal move, try again.")
+    assert not loadgen._push_opponent_move(board, "Opponent move: Ke8.")
+
+
+@patch("chesster.app.loadgen.ERROR_BACKOFF", 0.1)
+def test_post_throttled_and_transport_errors():
+    def _handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/throttled":
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        raise httpx.ConnectError("Connection refused.", request=request)
+
+    async def _run() -> tuple[loadgen.LoadStats, float]:
+        stats = loadgen.LoadStats()
+        transport = httpx.MockTransport(_handler)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://testserver"
+        ) as client:
+            assert await loadgen._post(client, stats, "throttled", "/throttled") is None
+            start = time.monotonic()
+            assert await loadgen._post(client, stats, "closed", "/closed") is None
+            return stats, time.monotonic() - start
+
+    stats, elapsed = asyncio.run(_run())
+    assert {"throttled": 1} == stats.throttled
+    assert {"closed": 1} == stats.errors
+    assert elapsed >= 0.1
+
+
+def test_run_load_in_process():
+    report = asyncio.run(loadgen.run_load(num_players=2, duration=2))
+    assert report["requests"] > 0
+    assert 0 == report["error_rate"]
+    assert {"initialize_game_vs_opponent", "make_move_vs_opponent"} >= set(
+        report["endpoints"]
+    )
@@ -0,0 +1,72 @@
+import asyncio
+from unittest.mock import patch
+
+import chess
+
+from chesster.app import position_index
+from chesster.app.board_manager import BoardManager
+from chesster.app.utils import parse_pgn_into_move_list
+
+
+PGN = "1. d4 Nf6 2. Nc3 g6 3. Bf4 Bg7 4. Nb5 d6"
+WHITE_SCORES = [20, 30, 250, 240, 240, 240, 240, 40]
+
+
+def _mock_engine_score(board: chess.Board, player_side: chess.Color) -> int:
+    """Score positions so that white's second move and black's last move stand out."""
+    return WHITE_SCORES[len(board.move_stack) - 1]
+
+
+def test_is_interesting_move():
+    assert position_index.is_interesting_move(-150, player_just_moved=True)
+    assert not position_index.is_interesting_move(-150, player_just_moved=False)
+    assert not position_index.is_interesting_move(100, player_just_moved=True)
+
+
+def test_get_interesting_plies():
+    white_scores = [20, 30, 250, 240, None, 240, 240, 40]
+    assert [2] == position_index.get_interesting_plies(white_scores, chess.WHITE)
+    assert [7] == position_index.get_interesting_plies(white_scores, chess.BLACK)
+
+
+@patch("chesster.app.position_index.get_engine_score", wraps=_mock_engine_score)
+def test_build_save_and_load(mock_engine_score, tmp_path):
+    pgn_path = tmp_path / "games.pgn"
+    pgn_path.write_text(f"{PGN}\n\n{PGN}\n")
+    index_path = str(tmp_path / "index.json.gz")
+
+    index = position_index.PositionIndex.load(index_path)
+    assert 1 == asyncio.run(position_index.build_index(index, [str(pgn_path)], 2))
+    assert 8 == mock_engine_score.call_count
+    index.save(index_path)
+
+    index = position_index.PositionIndex.load(index_path)
+    moves = list(parse_pgn_into_move_list(PGN))
+    assert WHITE_SCORES == index.get_game_scores(moves)
+    game = index.games[position_index.get_game_hash(moves)]
+    assert {"white": [2], "black": [7]} == game["flagged"]
+    board = chess.Board()
+    board.push(moves[0])
+    assert 20 == index.get_position_score(board)
+    assert 0 == asyncio.run(position_index.build_index(index, [str(pgn_path)], 2))
+
+
+@patch("chesster.app.board_manager.get_engine_score")
+def test_interesting_moves_from_index(mock_engine_score):
+    moves = list(parse_pgn_into_move_list(PGN))
+    board_manager = BoardManager()
+    board_manager.position_index = position_index.PositionIndex()
+    board_manager.position_index.add_game(moves, WHITE_SCORES)
+    assert [7] == board_manager.position_index.get_interesting_plies(moves, chess.BLACK)
+
+    async def _get_interesting_moves() -> list:
+        await board_manager.set_board(chess.Board())
+        await board_manager.set_player_side(chess.BLACK)
+        for move in moves:
+            await board_manager.make_move(move)
+        await board_manager.set_interesting_move_iterator()
+        return [result async for result in board_manager.interesting_move_iterator]
+
+    results = asyncio.run(_get_interesting_moves())
+    assert [200] == [result["last_move_centipawns"] for result in results]
+    mock_engine_score.assert_not_called()
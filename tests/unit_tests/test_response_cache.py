@@ -0,0 +1,61 @@
+from unittest.mock import patch
+
+import chess
+from langchain_core.agents import AgentAction
+
+from chesster.langserve import response_cache
+
+
+def _make_agent_input(user_message: str, board: chess.Board) -> dict:
+    return {
+        "user_message": user_message,
+        "chat_history": [],
+        "board_fen": board.fen(),
+        "player_side": "white",
+        "last_move": board.peek().uci() if board.move_stack else None,
+    }
+
+
+def test_get_key():
+    cache = response_cache.ResponseCache()
+    board = chess.Board()
+    key = cache.get_key(_make_agent_input("Give me a hint!", board))
+    assert key == cache.get_key(_make_agent_input("  give me a HINT ", board))
+    board.push_san("e4")
+    assert key != cache.get_key(_make_agent_input("Give me a hint!", board))
+
+    for user_message in ["e2e4", "Nf3", "let's play a game", "next move please", ""]:
+        assert cache.get_key(_make_agent_input(user_message, board)) is None
+    assert cache.get_key({"user_message": "Give me a hint", "chat_history": []}) is None
+    assert 6 == cache.metrics()["bypasses"]
+
+
+def test_get_and_set():
+    cache = response_cache.ResponseCache(max_size=2, ttl=10)
+    keys = [
+        cache.get_key(_make_agent_input(question, chess.Board()))
+        for question in ["Give me a hint", "Was that a blunder", "What is the plan"]
+    ]
+    assert cache.get(keys[0]) is None
+    cache.set(keys[0], "Control the center.")
+    assert "Control the center." == cache.get(keys[0])
+    cache.set(keys[1], "No.")
+    cache.set(keys[2], "Develop.")
+    assert cache.get(keys[0]) is None  # Evicted
+    with patch("time.monotonic", return_value=float("inf")):
+        assert cache.get(keys[1]) is None  # Expired
+    assert {
+        "size": 1,
+        "hits": 1,
+        "misses": 3,
+        "bypasses": 0,
+        "hit_rate": 0.25,
+    } == cache.metrics()
+
+
+def test_used_mutating_tool():
+    hint = (AgentAction(tool="get_hint", tool_input={}, log=""), {})
+    move = (AgentAction(tool="make_chess_move", tool_input={}, log=""), {})
+    assert not response_cache.used_mutating_tool([])
+    assert not response_cache.used_mutating_tool([hint])
+    assert response_cache.used_mutating_tool([hint, move])